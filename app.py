@@ -1,31 +1,83 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for
 import numpy as np
 import os
 import joblib
-from data_preprocessing import SepsisDataPreprocessor
+import json
+import secrets
+import threading
+from cachetools import TTLCache
+from data_preprocessing import prepare_for_prediction, ALERT_MSGS, BASE_DEFAULTS
+from batch_predictor import BatchedPredictor
+from compiled_model import compile_model
 from datetime import datetime
 
 app = Flask(__name__)
 app.secret_key = 'sepsis_prediction_secret_key_2' 
 MODEL_PATH = 'models/sepsis_model.pkl'
-SCALER_PATH = 'models/scaler.pkl'
-FEATURES_PATH = 'models/features.pkl'
+SCALER_MEAN_PATH = 'models/scaler_mean.npy'
+SCALER_INV_SCALE_PATH = 'models/scaler_invscale.npy'
+FEATURES_PATH = 'models/features.json'
 
 model = None
-scaler = None
 features = None
-preprocessor = SepsisDataPreprocessor()
+batcher = None
+MEAN = None
+INV_SCALE = None
+
+# Prediction results handed from /predict to /results, keyed by a URL token.
+# The TTLCache is process-local; set REDIS_URL so that every gunicorn worker
+# reads and writes the same store.
+RESULTS_TTL = 600
+RESULTS = TTLCache(maxsize=10_000, ttl=RESULTS_TTL)
+RESULTS_LOCK = threading.Lock()
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    import redis
+    results_store = redis.Redis.from_url(REDIS_URL)
+else:
+    results_store = None
+
+# Short-lived cache of assess_patient() output keyed by the submitted values
+PREDICTIONS = TTLCache(maxsize=1024, ttl=60)
+PREDICTIONS_LOCK = threading.Lock()
+
+# Form fields read by /predict as (name, cast, default)
+FIELDS = tuple(
+    (k, int if k in ('Age', 'Gender') else float, d) for k, d in BASE_DEFAULTS.items()
+)
+
+def scale_features(X):
+    """Standardise a feature matrix with the training scaler for the model"""
+    with np.errstate(over='ignore'):
+        X_scaled = (X - MEAN) * INV_SCALE
+    # The compiled predictor does no input validation, so reject what sklearn
+    # would: NaN, infinity, and values that overflow the float32 it compares in
+    if not (np.abs(X_scaled) <= np.finfo(np.float32).max).all():
+        raise ValueError("Input X contains NaN, infinity or a value too large for dtype('float32').")
+    # Trees compare in float32, so narrowing after scaling is lossless
+    return X_scaled.astype(np.float32)
 
 def load_model():
-    global model, scaler, features
+    global model, features, batcher, MEAN, INV_SCALE
     
     if not os.path.exists(MODEL_PATH):
         print("WARNING: Model files not found")
         return False
 
     model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    features = joblib.load(FEATURES_PATH)
+    MEAN = np.load(SCALER_MEAN_PATH)
+    INV_SCALE = np.load(SCALER_INV_SCALE_PATH)
+    with open(FEATURES_PATH) as f:
+        features = json.load(f)
+    predict_proba, backend = compile_model(model, len(features))
+    print(f"✓ Using {backend} predictor")
+    batcher = BatchedPredictor(predict_proba)
+    with PREDICTIONS_LOCK:
+        PREDICTIONS.clear()
+    # Warm-up prediction so JIT compilation and first-call allocations happen
+    # here rather than on the first /predict request
+    X, _, _ = prepare_for_prediction({k: d for k, _, d in FIELDS})
+    predict_proba(scale_features(X))
     print("✓ Model loaded successfully")
     return True
     
@@ -34,6 +86,59 @@ load_model()
 
 
 
+def save_result(prediction_results):
+    """Store a result for /results and return the token that retrieves it"""
+    token = secrets.token_urlsafe(8)
+    if results_store is not None:
+        results_store.setex(f'sepsis:result:{token}', RESULTS_TTL, json.dumps(prediction_results))
+    else:
+        with RESULTS_LOCK:
+            RESULTS[token] = prediction_results
+    return token
+
+def load_result(token):
+    """Return the result stored under token, or None if it expired or never existed"""
+    if not token:
+        return None
+    if results_store is not None:
+        data = results_store.get(f'sepsis:result:{token}')
+        return json.loads(data) if data is not None else None
+    with RESULTS_LOCK:
+        return RESULTS.get(token)
+
+def assess_patient(patient_data):
+    """Run the model and clinical scoring for one patient"""
+    X, _, extras = prepare_for_prediction(patient_data)
+    proba = batcher.predict_proba_one(scale_features(X))[0]
+    prediction = model.classes_[np.argmax(proba)]
+    probability = proba[1]
+    if probability >= 0.7:
+        risk_level = 'VERY HIGH'
+        risk_class = 'very-high'
+    elif probability >= 0.5:
+        risk_level = 'HIGH'
+        risk_class = 'high'
+    elif probability >= 0.3:
+        risk_level = 'MODERATE'
+        risk_class = 'moderate'
+    else:
+        risk_level = 'LOW'
+        risk_class = 'low'
+    sofa = extras['SOFA_approx']
+    sirs = extras['SIRS_count']
+    alert_mask = extras['alert_mask']
+    alerts = [msg for i, msg in enumerate(ALERT_MSGS) if alert_mask >> i & 1]
+    return {
+        'patient_data': patient_data,
+        'prediction': int(prediction),
+        'probability': float(probability),
+        'risk_level': risk_level,
+        'risk_class': risk_class,
+        'sofa_score': int(sofa),
+        'sirs_count': int(sirs),
+        'alerts': alerts
+    }
+
 @app.route('/')
 def index():
     """Home page"""
@@ -49,76 +154,27 @@ def predict():
                     'status': 'error',
                     'message': 'Model not loaded. Please run model_trainer.py first.'
                 }), 500
-            patient_data = {
-                'Age': int(request.form.get('Age', 50)),
-                'Gender': int(request.form.get('Gender', 1)),  # 1=Male, 0=Female
-                'HR': float(request.form.get('HR', 80)),
-                'O2Sat': float(request.form.get('O2Sat', 95)),
-                'Temp': float(request.form.get('Temp', 37)),
-                'SBP': float(request.form.get('SBP', 120)),
-                'MAP': float(request.form.get('MAP', 80)),
-                'DBP': float(request.form.get('DBP', 70)),
-                'Resp': float(request.form.get('Resp', 16)),
-                'WBC': float(request.form.get('WBC', 8)),
-                'Platelets': float(request.form.get('Platelets', 200)),
-                'Creatinine': float(request.form.get('Creatinine', 1.0)),
-                'Lactate': float(request.form.get('Lactate', 1.5))
-            }
-            X, feature_names = preprocessor.prepare_for_prediction(patient_data)
-            X_scaled = scaler.transform(X)
-            prediction = model.predict(X_scaled)[0]
-            probability = model.predict_proba(X_scaled)[0, 1]
-            if probability >= 0.7:
-                risk_level = 'VERY HIGH'
-                risk_class = 'very-high'
-            elif probability >= 0.5:
-                risk_level = 'HIGH'
-                risk_class = 'high'
-            elif probability >= 0.3:
-                risk_level = 'MODERATE'
-                risk_class = 'moderate'
-            else:
-                risk_level = 'LOW'
-                risk_class = 'low'
-            sofa = preprocessor.create_smart_features(patient_data)['SOFA_approx'].values[0]
-            sirs = preprocessor.create_smart_features(patient_data)['SIRS_count'].values[0]
-            alerts = []
-            if patient_data['HR'] > 100:
-                alerts.append('Tachycardia detected (HR > 100)')
-            if patient_data['SBP'] < 90:
-                alerts.append('Hypotension detected (SBP < 90)')
-            if patient_data['Temp'] > 38 or patient_data['Temp'] < 36:
-                alerts.append('Temperature abnormal')
-            if patient_data['Lactate'] > 2.0:
-                alerts.append('Elevated lactate (> 2.0)')
-            if patient_data['WBC'] > 12 or patient_data['WBC'] < 4:
-                alerts.append('Abnormal WBC count')
-            if patient_data['O2Sat'] < 92:
-                alerts.append('Low oxygen saturation')
-            if patient_data['Platelets'] < 150:
-                alerts.append('Thrombocytopenia detected')
-            if patient_data['Creatinine'] > 1.2:
-                alerts.append('Elevated creatinine')
-            if patient_data['Age'] >= 65:
-                alerts.append('Elderly patient - increased sepsis risk')
-            session['prediction_results'] = {
-                'patient_data': patient_data,
-                'prediction': int(prediction),
-                'probability': float(probability),
-                'risk_level': risk_level,
-                'risk_class': risk_class,
-                'sofa_score': int(sofa),
-                'sirs_count': int(sirs),
-                'alerts': alerts,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+            form = request.form
+            patient_data = {k: cast(form.get(k, d)) for k, cast, d in FIELDS}
+            # Resubmitting identical vitals (retries, demos) skips the model
+            key = tuple(patient_data.values())
+            with PREDICTIONS_LOCK:
+                assessment = PREDICTIONS.get(key)
+            if assessment is None:
+                assessment = assess_patient(patient_data)
+                with PREDICTIONS_LOCK:
+                    PREDICTIONS[key] = assessment
+            prediction_results = dict(
+                assessment, timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            )
+            token = save_result(prediction_results)
             if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({
                     'status': 'success',
-                    'redirect': url_for('results')
+                    'redirect': url_for('results', t=token)
                 })
             else:
-                return redirect(url_for('results'))
+                return redirect(url_for('results', t=token))
             
         except Exception as e:
             return jsonify({
@@ -131,7 +187,7 @@ def predict():
 @app.route('/results')
 def results():
     """Results page with detailed recommendations"""
-    prediction_results = session.get('prediction_results')
+    prediction_results = load_result(request.args.get('t'))
     
     if not prediction_results:
         return redirect(url_for('predict'))
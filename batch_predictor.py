@@ -0,0 +1,66 @@
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+
+class BatchedPredictor:
+    """Coalesce concurrent single-patient predictions into one predict_proba call"""
+
+    def __init__(self, predict_proba, max_batch=64):
+        self.predict_proba = predict_proba
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_worker(self):
+        # Started lazily so a model loaded before a gunicorn fork still gets
+        # a live worker thread in each child process.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def submit(self, X):
+        """Queue a (n, n_features) matrix and return a Future for its probabilities"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((X, future))
+        return future
+
+    def predict_proba_one(self, X, timeout=5.0):
+        """Blocking helper returning the probability rows for X"""
+        return self.submit(X).result(timeout=timeout)
+
+    def _collect(self):
+        # Block for the first request, then take whatever else is already
+        # queued. There is no timed wait: requests that arrive while a batch is
+        # being scored queue up and form the next batch on their own.
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(X, future) for X, future in self._collect()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+            try:
+                proba = self.predict_proba(np.vstack([X for X, _ in batch]))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for X, future in batch:
+                future.set_result(proba[start:start + len(X)])
+                start += len(X)
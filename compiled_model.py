@@ -0,0 +1,90 @@
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def compile_model(model, n_features):
+    """Return (predict_proba, backend) for a fitted sklearn classifier.
+
+    Random forests use the numba traversal below (exact, and the fastest at
+    batch size 1), once it has been checked against sklearn. Other estimators, such as HistGradientBoosting, and
+    installs without numba keep sklearn's own predict_proba.
+    """
+    if njit is not None and isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+        predict_proba = _compile_numba(model)
+        if matches_sklearn(predict_proba, model, n_features):
+            return predict_proba, 'numba'
+        print("WARNING: numba predictor disagrees with sklearn, using sklearn")
+    return model.predict_proba, 'sklearn'
+
+
+def matches_sklearn(predict_proba, model, n_features, n_samples=256):
+    """Check a compiled predict_proba against the sklearn model on a fixed random batch"""
+    X = np.random.default_rng(0).normal(size=(n_samples, n_features)).astype(np.float32)
+    return np.allclose(predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def flatten_forest(model):
+    """Concatenate every tree_ of the forest into shared contiguous node arrays.
+
+    Child indices are rebased to the flat arrays (leaves keep -1) and each
+    leaf stores its normalised class-1 probability, as in predict_proba.
+    """
+    feature, threshold, left, right, leaf_value, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        value = tree.value[:, 0, :]
+        totals = value.sum(axis=1)
+        totals[totals == 0] = 1.0
+        roots.append(offset)
+        feature.append(tree.feature)
+        threshold.append(tree.threshold)
+        left.append(np.where(tree.children_left == -1, -1, tree.children_left + offset))
+        right.append(np.where(tree.children_right == -1, -1, tree.children_right + offset))
+        leaf_value.append(value[:, 1] / totals)
+        offset += tree.node_count
+    return (
+        np.concatenate(feature).astype(np.intp),
+        np.concatenate(threshold).astype(np.float64),
+        np.concatenate(left).astype(np.intp),
+        np.concatenate(right).astype(np.intp),
+        np.concatenate(leaf_value).astype(np.float64),
+        np.array(roots, dtype=np.intp)
+    )
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _forest_proba(X, feature, threshold, left, right, leaf_value, roots):
+        """Average class-1 leaf probability over all trees for each row of X"""
+        n_trees = roots.shape[0]
+        out = np.empty(X.shape[0])
+        for i in range(X.shape[0]):
+            acc = 0.0
+            for t in range(n_trees):
+                node = roots[t]
+                while left[node] != -1:
+                    if X[i, feature[node]] <= threshold[node]:
+                        node = left[node]
+                    else:
+                        node = right[node]
+                acc += leaf_value[node]
+            out[i] = acc / n_trees
+        return out
+
+
+def _compile_numba(model):
+    """Return a predict_proba that walks the flattened forest with numba"""
+    arrays = flatten_forest(model)
+
+    def predict_proba(X):
+        # sklearn compares float32 feature values against the thresholds
+        p1 = _forest_proba(np.asarray(X, dtype=np.float32), *arrays)
+        return np.column_stack([1.0 - p1, p1])
+
+    return predict_proba
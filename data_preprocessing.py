@@ -1,192 +1,265 @@
-import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-import warnings
-warnings.filterwarnings('ignore')
-
-class SepsisDataPreprocessor:
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.feature_names = []
-        
-    def create_smart_features(self, patient_data):
-        """Create advanced clinical features from patient data including age and gender"""
-        df = pd.DataFrame([patient_data])
-        age = patient_data.get('Age', 50)
-        gender = patient_data.get('Gender', 1)  
-        df['age_high_risk'] = 1 if age >= 65 else 0
-        df['age_very_high_risk'] = 1 if age >= 75 else 0
-        df['age_pediatric'] = 1 if age < 18 else 0
-        df['gender_male'] = gender
-        df['elderly_male'] = 1 if (age >= 65 and gender == 1) else 0
-        o2sat = patient_data.get('O2Sat', 95)
-        df['resp_score'] = 0
-        if o2sat < 92:
-            df['resp_score'] = 1
-        if o2sat < 88:
-            df['resp_score'] = 2
-        map_val = patient_data.get('MAP', 80)
-        df['cardio_score'] = 0
-        if map_val < 70:
-            df['cardio_score'] = 1
-        if map_val < 60:
-            df['cardio_score'] = 2
-        platelets = patient_data.get('Platelets', 200)
-        df['coag_score'] = 0
-        if platelets < 150:
-            df['coag_score'] = 1
-        if platelets < 100:
-            df['coag_score'] = 2
-        creatinine = patient_data.get('Creatinine', 1.0)
-        creat_threshold = 1.2 if age < 65 else 1.4  # Higher threshold for elderly
-        df['renal_score'] = 0
-        if creatinine > creat_threshold:
-            df['renal_score'] = 1
-        if creatinine > 2.0:
-            df['renal_score'] = 2
-        df['SOFA_approx'] = df['resp_score'] + df['cardio_score'] + df['coag_score'] + df['renal_score']
-        hr = patient_data.get('HR', 80)
-        df['high_HR_flag'] = 1 if hr > 100 else 0
-        df['very_high_HR_flag'] = 1 if hr > 120 else 0
-        
-        sbp = patient_data.get('SBP', 120)
-        df['low_SBP_flag'] = 1 if sbp < 90 else 0
-        df['very_low_SBP_flag'] = 1 if sbp < 80 else 0
-        
-        temp = patient_data.get('Temp', 37)
-        df['fever_flag'] = 1 if temp > 38 else 0
-        df['hypothermia_flag'] = 1 if temp < 36 else 0
-        
-        resp = patient_data.get('Resp', 16)
-        df['high_resp_flag'] = 1 if resp > 22 else 0
-        
-        wbc = patient_data.get('WBC', 8)
-        df['high_WBC_flag'] = 1 if wbc > 12 else 0
-        df['low_WBC_flag'] = 1 if wbc < 4 else 0
-        df['qSOFA_approx'] = 0
-        if resp >= 22:
-            df['qSOFA_approx'] += 1
-        if sbp <= 100:
-            df['qSOFA_approx'] += 1
-        df['SIRS_count'] = 0
-        if hr > 90:
-            df['SIRS_count'] += 1
-        if resp > 20:
-            df['SIRS_count'] += 1
-        if temp < 36 or temp > 38:
-            df['SIRS_count'] += 1
-        if wbc < 4 or wbc > 12:
-            df['SIRS_count'] += 1
-        df['cardio_risk'] = (sbp < 90) * 2 + (map_val < 65) * 2 + (hr > 110) * 1
-        df['resp_risk'] = (o2sat < 90) * 3 + (resp > 25) * 1
-        df['metabolic_risk'] = (patient_data.get('Lactate', 1.5) > 2.0) * 2
-        df['multi_organ_risk'] = (df['SOFA_approx'] >= 2).astype(int)
-        df['severe_risk'] = (df['SIRS_count'] >= 3).astype(int)
-        age_factor = 1.2 if age >= 65 else 1.0
-        age_factor = age_factor * 1.3 if age >= 75 else age_factor
-        
-        df['age_adjusted_sofa'] = df['SOFA_approx'] * age_factor
-        df['age_adjusted_sirs'] = df['SIRS_count'] * age_factor
-        
-        return df
-    
-    def prepare_for_prediction(self, patient_data):
-        """Prepare patient data for model prediction"""
-        df = self.create_smart_features(patient_data)
-        base_features = ['Age', 'Gender', 'HR', 'O2Sat', 'Temp', 'SBP', 'MAP', 'DBP', 'Resp', 
-                        'WBC', 'Platelets', 'Creatinine', 'Lactate']
-        
-        engineered_features = [
-            'age_high_risk', 'age_very_high_risk', 'age_pediatric',
-            'gender_male', 'elderly_male',
-            'resp_score', 'cardio_score', 'coag_score', 'renal_score',
-            'SOFA_approx', 'high_HR_flag', 'very_high_HR_flag',
-            'low_SBP_flag', 'very_low_SBP_flag', 'fever_flag',
-            'hypothermia_flag', 'high_resp_flag', 'high_WBC_flag',
-            'low_WBC_flag', 'qSOFA_approx', 'SIRS_count',
-            'cardio_risk', 'resp_risk', 'metabolic_risk',
-            'multi_organ_risk', 'severe_risk',
-            'age_adjusted_sofa', 'age_adjusted_sirs'
-        ]
-        
-        all_features = base_features + engineered_features
-        for feature in all_features:
-            if feature not in df.columns:
-                if feature in base_features:
-                    df[feature] = patient_data.get(feature, 0)
-                else:
-                    df[feature] = 0
-        X = df[all_features].values
-        
-        return X, all_features
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Fallback when numba is not installed: run the kernel as plain Python"""
+        return lambda func: func
+
+BASE_FEATURES = ['Age', 'Gender', 'HR', 'O2Sat', 'Temp', 'SBP', 'MAP', 'DBP', 'Resp',
+                 'WBC', 'Platelets', 'Creatinine', 'Lactate']
+
+ENGINEERED_FEATURES = [
+    'age_high_risk', 'age_very_high_risk', 'age_pediatric',
+    'gender_male', 'elderly_male',
+    'resp_score', 'cardio_score', 'coag_score', 'renal_score',
+    'SOFA_approx', 'high_HR_flag', 'very_high_HR_flag',
+    'low_SBP_flag', 'very_low_SBP_flag', 'fever_flag',
+    'hypothermia_flag', 'high_resp_flag', 'high_WBC_flag',
+    'low_WBC_flag', 'qSOFA_approx', 'SIRS_count',
+    'cardio_risk', 'resp_risk', 'metabolic_risk',
+    'multi_organ_risk', 'severe_risk',
+    'age_adjusted_sofa', 'age_adjusted_sirs'
+]
+
+ALL_FEATURES = BASE_FEATURES + ENGINEERED_FEATURES
+FEATURE_INDEX = {name: i for i, name in enumerate(ALL_FEATURES)}
+
+
+# Clinical alert messages, indexed by the bits returned from _compute_features
+ALERT_MSGS = (
+    'Tachycardia detected (HR > 100)',
+    'Hypotension detected (SBP < 90)',
+    'Temperature abnormal',
+    'Elevated lactate (> 2.0)',
+    'Abnormal WBC count',
+    'Low oxygen saturation',
+    'Thrombocytopenia detected',
+    'Elevated creatinine',
+    'Elderly patient - increased sepsis risk'
+)
+
+# Default for each base feature when a vital/lab value is missing; app.py
+# builds its form fields from this table
+BASE_DEFAULTS = {
+    'Age': 50, 'Gender': 1,  # 1=Male, 0=Female
+    'HR': 80, 'O2Sat': 95, 'Temp': 37, 'SBP': 120, 'MAP': 80, 'DBP': 70,
+    'Resp': 16, 'WBC': 8, 'Platelets': 200, 'Creatinine': 1.0, 'Lactate': 1.5
+}
+
+# Inputs of _compute_features in argument order (DBP is not used)
+FEATURE_DEFAULTS = tuple((k, BASE_DEFAULTS[k]) for k in BASE_FEATURES if k != 'DBP')
+
+
+@njit(cache=True)
+def _age_terms(age):
+    """Age-derived constants: (high_risk, very_high_risk, pediatric, age_factor, creat_threshold)"""
+    age_factor = 1.2 if age >= 65 else 1.0
+    age_factor = age_factor * 1.3 if age >= 75 else age_factor
+    creat_threshold = 1.2 if age < 65 else 1.4  # Higher threshold for elderly
+    return (1.0 if age >= 65 else 0.0, 1.0 if age >= 75 else 0.0,
+            1.0 if age < 18 else 0.0, age_factor, creat_threshold)
+
+
+# Lookup table of _age_terms for the integer ages accepted by the form (0-120)
+_AGE_LUT = np.array([_age_terms(float(age)) for age in range(121)], dtype=np.float64)
+
+
+@njit(cache=True)
+def _compute_features(age, gender, hr, o2sat, temp, sbp, map_val, resp, wbc,
+                      platelets, creatinine, lactate, out):
+    """Write the engineered features, in ENGINEERED_FEATURES order, into `out`.
+
+    Returns the clinical alert bitfield: bit i is set when ALERT_MSGS[i] applies.
+    """
+    if 0 <= age < _AGE_LUT.shape[0] and age == int(age):
+        row = _AGE_LUT[int(age)]
+        high_risk, very_high_risk, pediatric = row[0], row[1], row[2]
+        age_factor, creat_threshold = row[3], row[4]
+    else:
+        high_risk, very_high_risk, pediatric, age_factor, creat_threshold = _age_terms(age)
+
+    out[0] = high_risk                                      # age_high_risk
+    out[1] = very_high_risk                                 # age_very_high_risk
+    out[2] = pediatric                                      # age_pediatric
+    out[3] = gender                                         # gender_male
+    out[4] = 1.0 if (high_risk == 1.0 and gender == 1) else 0.0  # elderly_male
+
+    resp_score = 2.0 if o2sat < 88 else 1.0 if o2sat < 92 else 0.0
+    cardio_score = 2.0 if map_val < 60 else 1.0 if map_val < 70 else 0.0
+    coag_score = 2.0 if platelets < 100 else 1.0 if platelets < 150 else 0.0
+    renal_score = 2.0 if creatinine > 2.0 else 1.0 if creatinine > creat_threshold else 0.0
+    sofa = resp_score + cardio_score + coag_score + renal_score
+    out[5] = resp_score
+    out[6] = cardio_score
+    out[7] = coag_score
+    out[8] = renal_score
+    out[9] = sofa                                           # SOFA_approx
+
+    out[10] = 1.0 if hr > 100 else 0.0                      # high_HR_flag
+    out[11] = 1.0 if hr > 120 else 0.0                      # very_high_HR_flag
+    out[12] = 1.0 if sbp < 90 else 0.0                      # low_SBP_flag
+    out[13] = 1.0 if sbp < 80 else 0.0                      # very_low_SBP_flag
+    out[14] = 1.0 if temp > 38 else 0.0                     # fever_flag
+    out[15] = 1.0 if temp < 36 else 0.0                     # hypothermia_flag
+    out[16] = 1.0 if resp > 22 else 0.0                     # high_resp_flag
+    out[17] = 1.0 if wbc > 12 else 0.0                      # high_WBC_flag
+    out[18] = 1.0 if wbc < 4 else 0.0                       # low_WBC_flag
+
+    qsofa = 0.0
+    if resp >= 22:
+        qsofa += 1.0
+    if sbp <= 100:
+        qsofa += 1.0
+    out[19] = qsofa                                         # qSOFA_approx
+    sirs = 0.0
+    if hr > 90:
+        sirs += 1.0
+    if resp > 20:
+        sirs += 1.0
+    if temp < 36 or temp > 38:
+        sirs += 1.0
+    if wbc < 4 or wbc > 12:
+        sirs += 1.0
+    out[20] = sirs                                          # SIRS_count
+
+    out[21] = ((2.0 if sbp < 90 else 0.0) + (2.0 if map_val < 65 else 0.0)
+               + (1.0 if hr > 110 else 0.0))                # cardio_risk
+    out[22] = (3.0 if o2sat < 90 else 0.0) + (1.0 if resp > 25 else 0.0)  # resp_risk
+    out[23] = 2.0 if lactate > 2.0 else 0.0                 # metabolic_risk
+    out[24] = 1.0 if sofa >= 2 else 0.0                     # multi_organ_risk
+    out[25] = 1.0 if sirs >= 3 else 0.0                     # severe_risk
+
+    out[26] = sofa * age_factor                             # age_adjusted_sofa
+    out[27] = sirs * age_factor                             # age_adjusted_sirs
+
+    alerts = 0
+    if hr > 100:
+        alerts |= 1 << 0
+    if sbp < 90:
+        alerts |= 1 << 1
+    if temp > 38 or temp < 36:
+        alerts |= 1 << 2
+    if lactate > 2.0:
+        alerts |= 1 << 3
+    if wbc > 12 or wbc < 4:
+        alerts |= 1 << 4
+    if o2sat < 92:
+        alerts |= 1 << 5
+    if platelets < 150:
+        alerts |= 1 << 6
+    if creatinine > 1.2:
+        alerts |= 1 << 7
+    if high_risk == 1.0:
+        alerts |= 1 << 8
+    return alerts
+
+
+def _compute(patient_data, out):
+    """Write the full feature vector for one patient into the 1-D array `out`, returning the alert bitfield"""
+    # Base features missing from the input are stored as 0, while the
+    # engineered features fall back to clinically normal defaults.
+    n_base = len(BASE_FEATURES)
+    for i, feature in enumerate(BASE_FEATURES):
+        out[i] = patient_data.get(feature, 0)
+    return _compute_features(*[float(patient_data.get(k, d)) for k, d in FEATURE_DEFAULTS],
+                             out[n_base:])
+
+
+@njit(cache=True)
+def _compute_features_batch(inputs, out):
+    """Run _compute_features over each row of the (n, 12) `inputs` array"""
+    for i in range(inputs.shape[0]):
+        r = inputs[i]
+        _compute_features(r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[8],
+                          r[9], r[10], r[11], out[i])
+
+
+def prepare_for_prediction(patient_data):
+    """Prepare patient data for model prediction, returning clinical scores and the alert bitfield alongside"""
+    out = np.empty((1, len(ALL_FEATURES)), dtype=np.float64)
+    alert_mask = _compute(patient_data, out[0])
+    extras = {
+        'SOFA_approx': out[0, FEATURE_INDEX['SOFA_approx']],
+        'SIRS_count': out[0, FEATURE_INDEX['SIRS_count']],
+        'alert_mask': alert_mask
+    }
+    return out, ALL_FEATURES, extras
+
+
+def prepare_batch(df):
+    """Prepare a whole DataFrame of patients at once, one row per patient"""
+    n = len(df)
+    n_base = len(BASE_FEATURES)
+    X = np.empty((n, len(ALL_FEATURES)), dtype=np.float64)
+    for i, feature in enumerate(BASE_FEATURES):
+        X[:, i] = df[feature].to_numpy() if feature in df else 0
+    inputs = np.column_stack([
+        df[k].to_numpy(dtype=np.float64) if k in df else np.full(n, d, dtype=np.float64)
+        for k, d in FEATURE_DEFAULTS
+    ])
+    _compute_features_batch(inputs, X[:, n_base:])
+    return X, ALL_FEATURES
+
 
 def generate_pretrained_model_data():
-    """Generate training data for the pre-trained model with age and gender"""
-    np.random.seed(42)
-    
-    data = []
+    """Generate training data for the pre-trained model with age and gender.
+
+    Writes sepsis_training_data.csv and returns the columns as a dict of arrays.
+    """
+    rng = np.random.default_rng(42)
     n_patients = 2000
+
+    is_sepsis = rng.random(n_patients) < 0.35
+
+    def draw(sepsis_mean, sepsis_std, normal_mean, normal_std):
+        return np.where(is_sepsis,
+                        rng.normal(sepsis_mean, sepsis_std, n_patients),
+                        rng.normal(normal_mean, normal_std, n_patients))
+
+    age = np.clip(np.trunc(draw(68, 15, 55, 18)).astype(int), 18, 95)
+    gender = (rng.random(n_patients) < np.where(is_sepsis, 0.55, 0.48)).astype(int)
+    hr = draw(110, 20, 80, 15)
+    temp = draw(38.5, 1.5, 37, 0.8)
+    resp = draw(24, 5, 16, 3)
+    sbp = draw(92, 15, 120, 15)
+    map_val = draw(65, 10, 80, 10)
+    wbc = draw(14, 4, 8, 2)
+    lactate = draw(3.5, 1.5, 1.2, 0.5)
+    platelets = draw(120, 40, 220, 60)
+    creatinine = draw(1.8, 0.8, 0.9, 0.3)
+    o2sat = draw(92, 4, 97, 2)
+
+    columns_data = {
+        'PatientID': np.arange(1, n_patients + 1),
+        'Age': age,
+        'Gender': gender,
+        'HR': np.clip(hr, 40, 180),
+        'O2Sat': np.clip(o2sat, 70, 100),
+        'Temp': np.clip(temp, 34, 42),
+        'SBP': np.clip(sbp, 60, 200),
+        'MAP': np.clip(map_val, 40, 140),
+        'DBP': np.clip(sbp - 40, 30, 120),
+        'Resp': np.clip(resp, 8, 40),
+        'WBC': np.clip(wbc, 1, 30),
+        'Platelets': np.clip(platelets, 20, 500),
+        'Creatinine': np.clip(creatinine, 0.3, 8),
+        'Lactate': np.clip(lactate, 0.5, 10),
+        'SepsisLabel': is_sepsis.astype(int)
+    }
+    columns = list(columns_data)
+    int_columns = ('PatientID', 'Age', 'Gender', 'SepsisLabel')
+    np.savetxt(
+        'sepsis_training_data.csv',
+        np.column_stack([columns_data[col] for col in columns]),
+        delimiter=',',
+        header=','.join(columns),
+        comments='',
+        fmt=['%d' if col in int_columns else '%s' for col in columns]
+    )
+    print(f"Generated training dataset: {n_patients} patients")
+    print(f"Sepsis cases: {columns_data['SepsisLabel'].sum()} ({columns_data['SepsisLabel'].mean()*100:.1f}%)")
+    print(f"Age range: {columns_data['Age'].min()}-{columns_data['Age'].max()} years")
+    print(f"Gender distribution: {columns_data['Gender'].mean()*100:.1f}% male")
     
-    for patient_id in range(1, n_patients + 1):
-        develops_sepsis = np.random.random() < 0.35
-        if develops_sepsis:
-            age = int(np.random.normal(68, 15))  
-        else:
-            age = int(np.random.normal(55, 18))  
-        age = max(18, min(95, age))  
-        if develops_sepsis:
-            gender = 1 if np.random.random() < 0.55 else 0  
-        else:
-            gender = 1 if np.random.random() < 0.48 else 0 
-        
-        if develops_sepsis:
-            hr = np.random.normal(110, 20)
-            temp = np.random.normal(38.5, 1.5)
-            resp = np.random.normal(24, 5)
-            sbp = np.random.normal(92, 15)
-            map_val = np.random.normal(65, 10)
-            wbc = np.random.normal(14, 4)
-            lactate = np.random.normal(3.5, 1.5)
-            platelets = np.random.normal(120, 40)
-            creatinine = np.random.normal(1.8, 0.8)
-            o2sat = np.random.normal(92, 4)
-        else:
-            hr = np.random.normal(80, 15)
-            temp = np.random.normal(37, 0.8)
-            resp = np.random.normal(16, 3)
-            sbp = np.random.normal(120, 15)
-            map_val = np.random.normal(80, 10)
-            wbc = np.random.normal(8, 2)
-            lactate = np.random.normal(1.2, 0.5)
-            platelets = np.random.normal(220, 60)
-            creatinine = np.random.normal(0.9, 0.3)
-            o2sat = np.random.normal(97, 2)
-        
-        row = {
-            'PatientID': patient_id,
-            'Age': age,
-            'Gender': gender,
-            'HR': max(40, min(180, hr)),
-            'O2Sat': max(70, min(100, o2sat)),
-            'Temp': max(34, min(42, temp)),
-            'SBP': max(60, min(200, sbp)),
-            'MAP': max(40, min(140, map_val)),
-            'DBP': max(30, min(120, sbp - 40)),
-            'Resp': max(8, min(40, resp)),
-            'WBC': max(1, min(30, wbc)),
-            'Platelets': max(20, min(500, platelets)),
-            'Creatinine': max(0.3, min(8, creatinine)),
-            'Lactate': max(0.5, min(10, lactate)),
-            'SepsisLabel': 1 if develops_sepsis else 0
-        }
-        
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-    df.to_csv('sepsis_training_data.csv', index=False)
-    print(f"Generated training dataset: {len(df)} patients")
-    print(f"Sepsis cases: {df['SepsisLabel'].sum()} ({df['SepsisLabel'].mean()*100:.1f}%)")
-    print(f"Age range: {df['Age'].min()}-{df['Age'].max()} years")
-    print(f"Gender distribution: {df['Gender'].mean()*100:.1f}% male")
-    
-    return df
\ No newline at end of file
+    return columns_data
\ No newline at end of file
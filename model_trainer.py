@@ -1,15 +1,56 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.inspection import permutation_importance
 from sklearn.preprocessing import StandardScaler
+from sklearn.neighbors import NearestNeighbors
 from imblearn.over_sampling import SMOTE
+import argparse
+import hashlib
 import joblib
+import json
 import os
-from data_preprocessing import SepsisDataPreprocessor, generate_pretrained_model_data
+import data_preprocessing
+from data_preprocessing import FEATURE_INDEX, prepare_batch, generate_pretrained_model_data
 
-def train_pretrained_model():
-    """Train the model that will be used for predictions"""
+CACHE_DIR = 'cache'
+
+def feature_cache_key(csv_path):
+    """Key for the cached feature matrix: the CSV and the feature code it was built from"""
+    parts = []
+    for path in (csv_path, data_preprocessing.__file__):
+        stat = os.stat(path)
+        parts.append(f"{stat.st_mtime}-{stat.st_size}")
+    return hashlib.blake2b('|'.join(parts).encode()).hexdigest()[:16]
+
+def load_or_build_features(df, csv_path):
+    """Return (X, y, features), reusing the on-disk cache when the CSV is unchanged"""
+    prefix = os.path.join(CACHE_DIR, f'features_{feature_cache_key(csv_path)}')
+    if os.path.exists(prefix + '.json'):
+        print(f"Using cached features: {prefix}_X.npy")
+        X = np.load(prefix + '_X.npy', mmap_mode='r')
+        y = np.load(prefix + '_y.npy', mmap_mode='r')
+        with open(prefix + '.json') as f:
+            features = json.load(f)
+        return X, y, features
+
+    X, features = prepare_batch(df)
+    y = df['SepsisLabel'].to_numpy(dtype=np.int8)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.save(prefix + '_X.npy', X)
+    np.save(prefix + '_y.npy', y)
+    # Written last so an interrupted run never leaves a half-built cache entry
+    with open(prefix + '.json', 'w') as f:
+        json.dump(features, f)
+    return X, y, features
+
+def train_pretrained_model(model_type='rf'):
+    """Train the model that will be used for predictions.
+
+    model_type is 'rf' (RandomForest, the shipped model) or 'hgb'
+    (HistGradientBoosting, faster to train and to score).
+    """
     
     print("="*60)
     print("TRAINING SEPSIS PREDICTION MODEL")
@@ -19,32 +60,23 @@ def train_pretrained_model():
 
     if not os.path.exists('sepsis_training_data.csv'):
         print("\n[1/7] Generating training dataset with demographics...")
-        df = generate_pretrained_model_data()
+        df = pd.DataFrame(generate_pretrained_model_data())
     else:
         print("\n[1/7] Loading training dataset...")
         df = pd.read_csv('sepsis_training_data.csv')
     
     print(f"Dataset: {df.shape[0]} patients, {df.shape[1]} features")
-    print(f"Sepsis prevalence: {df['SepsisLabel'].mean()*100:.1f}%")
-    print(f"Age range: {df['Age'].min():.0f}-{df['Age'].max():.0f} years")
-    print(f"Gender: {df['Gender'].mean()*100:.1f}% male, {(1-df['Gender'].mean())*100:.1f}% female")
+    age = df['Age'].to_numpy()
+    male_share = df['Gender'].to_numpy().mean()
+    print(f"Sepsis prevalence: {df['SepsisLabel'].to_numpy().mean()*100:.1f}%")
+    print(f"Age range: {age.min():.0f}-{age.max():.0f} years")
+    print(f"Gender: {male_share*100:.1f}% male, {(1-male_share)*100:.1f}% female")
     
 
     print("\n[2/7] Creating features with age and gender...")
-    preprocessor = SepsisDataPreprocessor()
     
 
-    X_list = []
-    y_list = []
-    
-    for idx, row in df.iterrows():
-        patient_data = row.to_dict()
-        X, features = preprocessor.prepare_for_prediction(patient_data)
-        X_list.append(X[0])
-        y_list.append(patient_data['SepsisLabel'])
-    
-    X = np.array(X_list)
-    y = np.array(y_list)
+    X, y, features = load_or_build_features(df, 'sepsis_training_data.csv')
     
     print(f"Feature matrix shape: {X.shape}")
     print(f"Total features: {len(features)}")
@@ -63,47 +95,70 @@ def train_pretrained_model():
     print(f"Test set: {X_test.shape[0]} samples")
     
 
-    train_indices = [i for i in range(len(y)) if i < len(y_train)]
-    test_indices = [i for i in range(len(y)) if i >= len(y_train)]
+    tr_counts = np.bincount(y_train.astype(np.intp), minlength=2)
+    te_counts = np.bincount(y_test.astype(np.intp), minlength=2)
     
     print(f"Training set demographics:")
-    print(f"  - Sepsis cases: {sum(y_train == 1)} ({sum(y_train == 1)/len(y_train)*100:.1f}%)")
+    print(f"  - Sepsis cases: {tr_counts[1]} ({tr_counts[1]/len(y_train)*100:.1f}%)")
     print(f"Test set demographics:")
-    print(f"  - Sepsis cases: {sum(y_test == 1)} ({sum(y_test == 1)/len(y_test)*100:.1f}%)")
+    print(f"  - Sepsis cases: {te_counts[1]} ({te_counts[1]/len(y_test)*100:.1f}%)")
     
 
     print("\n[4/7] Scaling features...")
     scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    # Trees split on float32 anyway; scale in float64, then narrow once
+    X_train_scaled = scaler.fit_transform(X_train).astype(np.float32)
+    X_test_scaled = scaler.transform(X_test).astype(np.float32)
     
 
     print("\n[5/7] Handling class imbalance with SMOTE...")
-    print(f"Before SMOTE - Class 0: {sum(y_train == 0)}, Class 1: {sum(y_train == 1)}")
+    print(f"Before SMOTE - Class 0: {tr_counts[0]}, Class 1: {tr_counts[1]}")
     
-    smote = SMOTE(random_state=42, k_neighbors=5)
+    # k=5 neighbours (6 including the sample itself), searched on all cores
+    smote = SMOTE(random_state=42, k_neighbors=NearestNeighbors(n_neighbors=6, n_jobs=-1))
     X_train_balanced, y_train_balanced = smote.fit_resample(X_train_scaled, y_train)
     
-    print(f"After SMOTE - Class 0: {sum(y_train_balanced == 0)}, Class 1: {sum(y_train_balanced == 1)}")
-    
-
-    print("\n[6/7] Training Random Forest model...")
-    print("Model configuration:")
-    print("  - n_estimators: 200")
-    print("  - max_depth: 20")
-    print("  - min_samples_split: 5")
-    print("  - min_samples_leaf: 2")
-    print("  - class_weight: balanced")
-    
-    model = RandomForestClassifier(
-        n_estimators=200,
-        max_depth=20,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        class_weight='balanced',
-        random_state=42,
-        n_jobs=-1
-    )
+    bal_counts = np.bincount(y_train_balanced.astype(np.intp), minlength=2)
+    print(f"After SMOTE - Class 0: {bal_counts[0]}, Class 1: {bal_counts[1]}")
+    # Only the balanced copy is needed from here on; free the pre-SMOTE
+    # matrices so they do not add to peak memory while the model trains
+    del X_train, X_train_scaled
+    
+
+    if model_type == 'hgb':
+        print("\n[6/7] Training HistGradientBoosting model...")
+        print("Model configuration:")
+        print("  - max_iter: 300 (early stopping)")
+        print("  - max_depth: 8")
+        print("  - learning_rate: 0.05")
+        print("  - class_weight: balanced")
+        
+        model = HistGradientBoostingClassifier(
+            max_iter=300,
+            max_depth=8,
+            learning_rate=0.05,
+            class_weight='balanced',
+            early_stopping=True,
+            random_state=42
+        )
+    else:
+        print("\n[6/7] Training Random Forest model...")
+        print("Model configuration:")
+        print("  - n_estimators: 200")
+        print("  - max_depth: 20")
+        print("  - min_samples_split: 5")
+        print("  - min_samples_leaf: 2")
+        print("  - class_weight: balanced")
+        
+        model = RandomForestClassifier(
+            n_estimators=200,
+            max_depth=20,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            class_weight='balanced',
+            random_state=42,
+            n_jobs=-1
+        )
     
     model.fit(X_train_balanced, y_train_balanced)
     print("✓ Model trained successfully!")
@@ -112,8 +167,10 @@ def train_pretrained_model():
     print("\n[7/7] Evaluating model performance...")
     from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, confusion_matrix
     
-    y_pred = model.predict(X_test_scaled)
-    y_pred_proba = model.predict_proba(X_test_scaled)[:, 1]
+    # One pass over the forest; predict() is just the argmax of these probabilities
+    proba = model.predict_proba(X_test_scaled)
+    y_pred_proba = proba[:, 1]
+    y_pred = model.classes_.take(np.argmax(proba, axis=1))
     
     accuracy = accuracy_score(y_test, y_pred)
     precision = precision_score(y_test, y_pred)
@@ -143,22 +200,24 @@ def train_pretrained_model():
     print(f"\n{'='*50}")
     print(f"Top 15 Most Important Features:")
     print(f"{'='*50}")
-    feature_importance = pd.DataFrame({
-        'feature': features,
-        'importance': model.feature_importances_
-    }).sort_values('importance', ascending=False)
+    if model_type == 'hgb':
+        # HistGradientBoosting has no impurity importances; use permutation importance
+        importances = permutation_importance(
+            model, X_test_scaled, y_test, n_repeats=5, random_state=42, n_jobs=-1
+        ).importances_mean
+    else:
+        importances = model.feature_importances_
+    order = np.argsort(-importances)
+    ranks = {features[i]: r for r, i in enumerate(order, 1)}
     
-    for idx, row in feature_importance.head(15).iterrows():
-        print(f"  {row['feature']:25s} {row['importance']:.4f}")
+    for i in order[:15]:
+        print(f"  {features[i]:25s} {importances[i]:.4f}")
     
 
-    age_importance = feature_importance[feature_importance['feature'] == 'Age']['importance'].values
-    gender_importance = feature_importance[feature_importance['feature'] == 'Gender']['importance'].values
-    
-    if len(age_importance) > 0:
-        print(f"\n  Age importance: {age_importance[0]:.4f} (Rank: {list(feature_importance['feature']).index('Age') + 1})")
-    if len(gender_importance) > 0:
-        print(f"  Gender importance: {gender_importance[0]:.4f} (Rank: {list(feature_importance['feature']).index('Gender') + 1})")
+    if 'Age' in ranks:
+        print(f"\n  Age importance: {importances[FEATURE_INDEX['Age']]:.4f} (Rank: {ranks['Age']})")
+    if 'Gender' in ranks:
+        print(f"  Gender importance: {importances[FEATURE_INDEX['Gender']]:.4f} (Rank: {ranks['Gender']})")
     
 
     print(f"\n{'='*50}")
@@ -166,15 +225,25 @@ def train_pretrained_model():
     print(f"{'='*50}")
     os.makedirs('models', exist_ok=True)
     
-    joblib.dump(model, 'models/sepsis_model.pkl')
-    joblib.dump(scaler, 'models/scaler.pkl')
-    joblib.dump(features, 'models/features.pkl')
+    # Uncompressed: the forest is under 1 MB, so compression saves little and slows loading
+    joblib.dump(model, 'models/sepsis_model.pkl', compress=False)
+    joblib.dump(scaler, 'models/scaler.pkl', compress=False)
+    joblib.dump(features, 'models/features.pkl', compress=False)
+    # Plain .npy/.json sidecars that app.py loads without unpickling
+    np.save('models/scaler_mean.npy', scaler.mean_)
+    np.save('models/scaler_invscale.npy', 1.0 / scaler.scale_)
+    with open('models/features.json', 'w') as f:
+        json.dump(list(features), f)
     
     print("✓ Model saved to: models/sepsis_model.pkl")
-    print("✓ Scaler saved to: models/scaler.pkl")
-    print("✓ Features saved to: models/features.pkl")
+    print("✓ Scaler saved to: models/scaler.pkl (+ scaler_mean.npy, scaler_invscale.npy)")
+    print("✓ Features saved to: models/features.pkl (+ features.json)")
     
 
+    feature_importance = pd.DataFrame({
+        'feature': np.array(features)[order],
+        'importance': importances[order]
+    })
     feature_importance.to_csv('models/feature_importance.csv', index=False)
     print("✓ Feature importance saved to: models/feature_importance.csv")
     
@@ -193,4 +262,8 @@ def train_pretrained_model():
     return model, scaler, features
 
 if __name__ == "__main__":
-    train_pretrained_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Train the sepsis prediction model')
+    parser.add_argument('--model', choices=['rf', 'hgb'], default='rf',
+                        help='rf: RandomForest (default), hgb: HistGradientBoosting')
+    args = parser.parse_args()
+    train_pretrained_model(args.model)
\ No newline at end of file